@@ -1,28 +1,100 @@
+import functools
+import numpy as np
+import pandas as pd
+
+
+# Placeholder labels that do not give a location.
+_INVALID_REGIONS = frozenset(('unknown', 'misc', 'None', 'nan', ''))
+
+
+def _RegionSet(*regions):
+  '''Returns the canonical lowercased, stripped, deduplicated form of a
+     region list.'''
+  return frozenset(s.lower().strip() for s in regions)
+
+
+@functools.lru_cache(maxsize=64)
+def _Canonical(regions):
+  '''Returns the canonical form of a frozenset of regions.  Cached, so
+     repeatedly used region sets are only lowercased once.'''
+  return _RegionSet(*regions)
+
+
+@functools.lru_cache(maxsize=64)
+def _Sides(regions):
+  '''Returns the canonical form of a frozenset of regions, and its Left and
+     Right variants, as three frozensets.  Cached, so the canonical region
+     sets are only expanded once.'''
+  regions = _Canonical(regions)
+  return (regions, frozenset('left '+s for s in regions),
+    frozenset('right '+s for s in regions))
+
+
+_HIPPOCAMPUS_REGIONS = _RegionSet(
+    'CA1', 'CA2', 'CA3', 'CA4', 'Hippocampal', 'Hippocampus', 'Sub', 'DG',
+    'ba35', '"dg"', '"ca1"', '"sub"', '"ba35"')
+_MTL_REGIONS = _RegionSet(
+    *_HIPPOCAMPUS_REGIONS, 'prc', 'ec', 'phc', 'mtl wm', 'amy',
+    'parahippocampal', 'entorhinal', 'temporalpole', 'amygdala',
+    'ent entorhinal area', 'hippocampus', 'phg parahippocampal gyrus',
+    'tmp temporal pole', '"erc"', '"phc"', 'erc')
+_LTC_REGIONS = _RegionSet(
+    'middle temporal gyrus', 'stg', 'mtg', 'itg', 'inferior temporal gyrus',
+    'superior temporal gyrus', 'tc', 'bankssts', 'middletemporal',
+    'inferiortemporal', 'superiortemporal', 'itg inferior temporal gyrus',
+    'mtg middle temporal gyrus', 'stg superior temporal gyrus')
+_TEMPORAL_REGIONS = _RegionSet(
+    *_MTL_REGIONS, *_LTC_REGIONS, 'fusiform gyrus wm', 'fusiform',
+    'transversetemporal')
+_PFC_REGIONS = _RegionSet(
+    'caudal middle frontal cortex', 'dlpfc', 'precentral gyrus',
+    'superior frontal gyrus', 'mfg middle frontal gyrus',
+    'trifg triangular part of the inferior frontal gyrus',
+    'caudalmiddlefrontal', 'frontalpole', 'lateralorbitofrontal',
+    'medialorbitofrontal', 'parsopercularis', 'parsorbitalis',
+    'parstriangularis', 'rostralmiddlefrontal', 'superiorfrontal')
+_CINGULATE_REGIONS = _RegionSet(
+    'mcg', 'acg', 'pcg', 'caudalanteriorcingulate', 'isthmuscingulate',
+    'posteriorcingulate', 'rostralanteriorcingulate')
+_PARIETAL_REGIONS = _RegionSet(
+    'supramarginal gyrus', 'inferiorparietal', 'postcentral', 'precuneus',
+    'superiorparietal', 'supramarginal')
+_OTHER_REGIONS = _RegionSet(
+    'precentral gyrus', 'none', 'insula', 'nan', 'misc', 'precentral',
+    'paracentral', 'inf lat vent', 'cerebral white matter',
+    'lateral ventricle')
+
+
 class Locator():
-  '''A class for localizing intracranial contacts.  To obtain a list of
+  '''A class for localizing intracranial contacts.  To obtain the set of
      contact labels matched to each region, one can use this like:
 
        Locator(None).hippocampus_regions
-     
-     Available region lists are (note, some are subsets of others!):
+
+     These are frozensets of lowercased labels, shared by all instances.
+     Available region sets are (note, some are subsets of others!):
      hippocampus_regions, mtl_regions, ltc_regions, temporal_regions,
      pfc_regions, cingulate_regions, parietal_regions, other_regions.
 
-     To obtain a boolean mask of pairs, you pass a reader for a session
-     in, and can use one of these approaches:
+     To obtain a boolean numpy array mask of pairs, you pass a reader for a
+     session in, and can use one of these approaches:
 
        # Matches left, right, or unspecified side.
        mask = Locator(reader).Hippocampus()
        mask = Locator(reader).LeftHippocampus()
 
-       # e.g., you can store this list in your settings, to write
+       # e.g., you can store these regions in your settings, to write
        # generic code that processes many regions, switched by settings.
-       regions = Locator(None).hippocampus_regions
+       # They are frozensets, so convert with sorted(...) before storing,
+       # for a JSON-serializable list in a stable order.
+       regions = sorted(Locator(None).hippocampus_regions)
        # Regions by default matches left, right, or unspecified side.
        mask = Locator(reader).Regions(regions)
        mask = Locator(reader).RightRegions(regions)
 
        mask = Locator(reader).Matching(['left CA1', 'right CA3'])
+       # Matches any label starting with one of these, like 'left mtg'.
+       mask = Locator(reader).MatchingPrefix(['left mtg', 'left stg'])
 
      Available functions for returning region specific matches:
        Hippocampus, MTL, LTC, Temporal, PFC, Cingulate, Parietal.
@@ -33,106 +105,107 @@ class Locator():
      MTL, LTC, PFC, Cingulate, and Parietal.
 
      The call Locator(reader).All() returns a list of the
-     "best available" labels for every pair.'''
+     "best available" labels for every pair.
+
+     When holding many masks at once, they can be packed 8 channels per
+     byte, and combined while packed:
+
+       bits = Locator.PackMask(loc.MTL()) & Locator.PackMask(other_mask)
+       mask = Locator.UnpackMask(bits, len(other_mask))'''
 
-  __version__ = '2024.06.05'
+  __version__ = '2026.10.15'
 
   def __init__(self, reader):
     '''Throws an exception from reader.load('pairs') if pairs.json does
        not exist.'''
     self.reader = reader
-    self.hippocampus_regions = \
-        ['CA1', 'CA2', 'CA3', 'CA4', 'Hippocampal', 'Hippocampus', 'Sub',
-         'DG', 'ba35', 'ba35', '"dg"', '"ca1"', '"sub"', '"ba35"', '"ba35"']
-    self.mtl_regions = \
-        [*self.hippocampus_regions, 'prc', 'ec', 'phc', 'mtl wm', 'amy',
-         'parahippocampal', 'entorhinal', 'temporalpole', 'amygdala',
-         'ent entorhinal area', 'hippocampus', 'phg parahippocampal gyrus',
-         'tmp temporal pole', '"erc"', '"phc"', 'erc']
-    self.ltc_regions = \
-        ['middle temporal gyrus', 'stg', 'mtg', 'itg',
-         'inferior temporal gyrus', 'superior temporal gyrus', 'tc',
-         'bankssts', 'middletemporal', 'inferiortemporal', 'superiortemporal',
-         'itg inferior temporal gyrus', 'mtg middle temporal gyrus',
-         'stg superior temporal gyrus']
-    self.temporal_regions = \
-        [*self.mtl_regions, *self.ltc_regions, 'fusiform gyrus wm',
-         'fusiform', 'transversetemporal']
-    self.pfc_regions = \
-        ['caudal middle frontal cortex', 'dlpfc', 'precentral gyrus',
-         'precentral gyrus', 'superior frontal gyrus',
-         'mfg middle frontal gyrus',
-         'trifg triangular part of the inferior frontal gyrus',
-         'caudalmiddlefrontal', 'frontalpole', 'lateralorbitofrontal',
-         'medialorbitofrontal', 'parsopercularis', 'parsorbitalis',
-         'parstriangularis', 'rostralmiddlefrontal', 'superiorfrontal']
-    self.cingulate_regions = \
-        ['mcg', 'acg', 'pcg', 'caudalanteriorcingulate',
-         'isthmuscingulate', 'posteriorcingulate',
-         'rostralanteriorcingulate']
-    self.parietal_regions = \
-        ['supramarginal gyrus', 'supramarginal gyrus', 'inferiorparietal',
-         'postcentral', 'precuneus', 'superiorparietal',
-         'supramarginal']
-    self.other_regions = \
-        ['precentral gyrus', 'none', 'insula', 'precentral gyrus', 'nan',
-         'misc', 'insula', 'precentral', 'paracentral', 'inf lat vent'
-         'cerebral white matter', 'lateral ventricle']
+    self.hippocampus_regions = _HIPPOCAMPUS_REGIONS
+    self.mtl_regions = _MTL_REGIONS
+    self.ltc_regions = _LTC_REGIONS
+    self.temporal_regions = _TEMPORAL_REGIONS
+    self.pfc_regions = _PFC_REGIONS
+    self.cingulate_regions = _CINGULATE_REGIONS
+    self.parietal_regions = _PARIETAL_REGIONS
+    self.other_regions = _OTHER_REGIONS
 
     if reader is not None:
       self.__locations = self.__LoadLocations()
 
 
   def __LoadLocations(self):
-    def SetIfValid(reg, ri):
+    def ValidRegion(reg):
       if not isinstance(reg, str):
-        return
+        return None
       reg = reg.strip()
-      if reg in ['unknown', 'misc', 'None', 'nan', '']:
-        return
-      locations[ri] = reg
+      if reg in _INVALID_REGIONS:
+        return None
+      return reg
+
+    def SetIfValid(reg, ri):
+      reg = ValidRegion(reg)
+      if reg is not None:
+        locations[ri] = reg
 
     def UpdateLocations(regionlabel):
       if regionlabel in pairs.columns:
-        for ri in range(chan_cnt):
-          if locations[ri] is not None:
-            continue
-          reg = pairs[regionlabel][ri]
-          SetIfValid(reg, ri)
+        regs = pairs[regionlabel].map(ValidRegion)
+        fill = regs.notna().to_numpy() & pd.isnull(locations)
+        locations[fill] = regs.to_numpy()[fill]
 
     pairs = self.reader.load('pairs')
     chan_cnt = len(pairs)
-    locations = [None for _ in range(chan_cnt)]
+    locations = np.full(chan_cnt, None, dtype=object)
 
     UpdateLocations('stein.region')
     UpdateLocations('das.region')
 
+    # Sessions without a localization are common, and simply skip this.
     try:
       locjson = self.reader.load('localization')
-      whbr = locjson.loc['contacts']['atlases.whole_brain']
+      whbr = locjson.loc['contacts']['atlases.whole_brain'].to_dict()
+    except (FileNotFoundError, KeyError):
+      whbr = None
 
-      # Match pairs to contacts that are both in the same region
-      labels = self.reader.load('pairs').label
-      if len(labels) != chan_cnt:
-        raise IndexError('label mismatch')
+    # Match pairs to contacts that are both in the same region
+    if whbr is not None and 'label' in pairs.columns:
+      labels = pairs.label.to_numpy()
       for ri in range(chan_cnt):
-        if locations[ri] is not None:
+        if locations[ri] is not None or not isinstance(labels[ri], str):
           continue
-        label = labels[ri]
-        spl = label.split('-')
-        if spl[0] in whbr.keys() and spl[1] in whbr.keys():
-          if whbr[spl[0]] == whbr[spl[1]]:
-            reg = whbr[spl[0]]
-            SetIfValid(reg, ri)
-    except:
-      pass
+        first, _, second = labels[ri].partition('-')
+        reg = whbr.get(first)
+        if reg is not None and reg == whbr.get(second):
+          SetIfValid(reg, ri)
 
     UpdateLocations('mni.region')
     UpdateLocations('ind.region')
 
-    locations = [s.strip() if isinstance(s, str) else None for s in locations]
+    locations = locations.tolist()
+    # The lowercased labels are categorized once here.  Many channels share
+    # a label, so regions are tested once per distinct label, and channels
+    # are then matched by integer code, with -1 for no label.
+    norm = tuple(s.lower() if isinstance(s, str) else None for s in locations)
+    cat = pd.Categorical(norm)
+    self.__location_codes = cat.codes
+    self.__location_code_of = {s: c for c, s in enumerate(cat.categories)}
+    # Masks by frozenset of canonical regions, or by tuple of these for
+    # Regions.  Locations never change after loading, so these never need
+    # invalidating.
+    self.__mask_cache = {}
+
+    return tuple(locations)
+
+
+  @staticmethod
+  def PackMask(mask):
+    '''Returns a boolean mask packed into a uint8 array of bits.'''
+    return np.packbits(mask)
 
-    return locations
+
+  @staticmethod
+  def UnpackMask(bits, count):
+    '''Returns the boolean mask of count channels packed by PackMask.'''
+    return np.unpackbits(bits, count=count).astype(np.bool_)
 
 
   def All(self):
@@ -140,7 +213,7 @@ class Locator():
        in reader.load('pairs').  Prioritization goes in order of
        stein.region, das.region, load('localization') when both contacts
        are in the same region, mni.region, ind.region.'''
-    return [s for s in self.__locations]
+    return list(self.__locations)
 
 
   def Matching(self, regions):
@@ -149,23 +222,44 @@ class Locator():
        whitespace.'''
     if isinstance(regions, str):
       regions = [regions]
-    valid = [s.lower().strip() for s in regions]
-    locarr = [s.lower().strip() in valid \
-      if isinstance(s, str) else False for s in self.__locations]
-    return locarr
+    return self.__MatchingCanonical(_Canonical(frozenset(regions)))
+
+
+  def MatchingPrefix(self, prefixes):
+    '''Returns a boolean mask of reader.load('pairs') channels starting
+       with any of the given prefixes, case insensitive, and ignoring outer
+       whitespace.'''
+    if isinstance(prefixes, str):
+      prefixes = [prefixes]
+    prefixes = tuple(_Canonical(frozenset(prefixes)))
+    return np.isin(self.__location_codes, [c for s, c in
+      self.__location_code_of.items() if s.startswith(prefixes)])
+
+
+  def __MatchingCanonical(self, valid):
+    '''As Matching, for a frozenset of already lowercased and stripped
+       regions, or a tuple of these to match any of.  Returns a copy of a
+       memoized mask, so callers may modify it freely.'''
+    locarr = self.__mask_cache.get(valid)
+    if locarr is None:
+      if isinstance(valid, tuple):
+        locarr = np.logical_or.reduce(
+          [self.__MatchingCanonical(v) for v in valid])
+      else:
+        locarr = np.isin(self.__location_codes, [c for s, c in
+          self.__location_code_of.items() if s in valid])
+      self.__mask_cache[valid] = locarr
+    return locarr.copy()
 
 
   def Regions(self, regions):
     '''Returns a boolean mask of left or right reader.load('pairs') channels in
        the given regions.'''
     if regions is None:
-      return [True for s in self.__locations]
+      return np.ones(len(self.__locations), dtype=np.bool_)
     if isinstance(regions, str):
       regions = [regions]
-    bothsides = [s for s in regions]
-    bothsides.extend('Left '+s for s in regions)
-    bothsides.extend('Right '+s for s in regions)
-    return self.Matching(bothsides)
+    return self.__MatchingCanonical(_Sides(frozenset(regions)))
 
 
   def LeftRegions(self, regions):
@@ -173,7 +267,7 @@ class Locator():
        the given regions.'''
     if isinstance(regions, str):
       regions = [regions]
-    return self.Matching(['Left '+s for s in regions])
+    return self.__MatchingCanonical(_Sides(frozenset(regions))[1])
 
 
   def RightRegions(self, regions):
@@ -181,7 +275,7 @@ class Locator():
        the given regions.'''
     if isinstance(regions, str):
       regions = [regions]
-    return self.Matching(['Right '+s for s in regions])
+    return self.__MatchingCanonical(_Sides(frozenset(regions))[2])
 
 
   def Hippocampus(self):
@@ -1,14 +1,21 @@
+import os
+import re
 from setuptools import setup
 
-from Locator import Locator
+# Read the version without importing Locator, whose dependencies may not be
+# installed yet.
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'Locator.py')) as fr:
+  version = re.search(r"^\s*__version__ = '([^']*)'", fr.read(),
+    re.MULTILINE).group(1)
 
 setup(
    name='Locator',
-   version=Locator.__version__,
+   version=version,
    description='Intracranial contact localization class',
    author='Ryan A. Colyer',
    author_email='rcolyer@sas.upenn.edu',
    packages=[], 
-   install_requires=['cmlreaders']
+   install_requires=['cmlreaders', 'numpy', 'pandas']
 )
 